@@ -1,23 +1,50 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import tempfile
+import copy
 import os
-from io import StringIO
-import sys
+import hashlib
+import importlib.util
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
-# Configuración de matplotlib para Streamlit
-plt.style.use('default')
 st.set_page_config(page_title="pICNIK - Análisis Isoconversional", layout="wide")
 
-# Intentar importar pICNIK
-try:
-    import picnik as pnk
-    PICNIK_AVAILABLE = True
-except ImportError:
-    PICNIK_AVAILABLE = False
-    st.error("⚠️ La librería pICNIK no está instalada. Por favor, instálala con: pip install picnik")
+# Comprobar que pICNIK está instalado (se importa sólo cuando un módulo lo necesita)
+PICNIK_AVAILABLE = importlib.util.find_spec("picnik") is not None
+PICNIK_INSTALL_MSG = "⚠️ La librería pICNIK no está instalada. Por favor, instálala con: pip install picnik"
+if not PICNIK_AVAILABLE:
+    st.error(PICNIK_INSTALL_MSG)
+
+# Importaciones diferidas de las librerías pesadas: una sola vez por proceso
+@st.cache_resource(show_spinner=False)
+def import_pyplot():
+    """Importa matplotlib.pyplot"""
+    import matplotlib.pyplot as plt
+    return plt
+
+def load_pyplot():
+    """Devuelve pyplot con el estilo por defecto (pICNIK lo cambia globalmente en Conversion)"""
+    plt = import_pyplot()
+    plt.style.use('default')
+    return plt
+
+@st.cache_resource(show_spinner=False)
+def load_picnik():
+    """Importa la librería pICNIK"""
+    import picnik
+    return picnik
+
+# Función para importar pICNIK en su primer uso: find_spec sólo comprueba que exista el módulo,
+# no sus dependencias (picnik_integrator, rxn_models, seaborn, scipy)
+def require_picnik():
+    """Importa pICNIK o detiene la app con el mensaje de instalación si falla la importación"""
+    try:
+        return load_picnik()
+    except ImportError:
+        st.error(PICNIK_INSTALL_MSG)
+        st.stop()
 
 st.title("🔬 pICNIK - Análisis Isoconversional")
 
@@ -31,10 +58,15 @@ def initialize_session_state():
         'B': None,
         'T0': None,
         'xtr': None,
+        'xtr_raw': None,
+        'data_key': None,
         'Iso_Tables': None,
         'ace': None,
+        'ace_key': None,
         'calculated_energies': {},
         'conversion_done': False,
+        'conversion_key': None,
+        'iso_key': None,
         'isoconversion_done': False,
         't_min': 420.0,
         't_max': 820.0,
@@ -47,35 +79,186 @@ def initialize_session_state():
 
 initialize_session_state()
 
+# Conservar el rango de temperatura aunque sus widgets (key="t_min"/"t_max") no se muestren en este módulo
+for key in ("t_min", "t_max"):
+    st.session_state[key] = st.session_state[key]
+
+# Límites de las cachés de datos: se comparten entre todas las sesiones del servidor y cada entrada
+# puede ocupar varios MB (objetos de pICNIK y figuras), así que se acotan en número y en tiempo
+CACHE_MAX_ENTRIES = 16
+CACHE_TTL = 3600  # segundos
+
 # Función para mostrar gráficos de matplotlib
-def show_matplotlib_plot():
-    """Captura y muestra gráficos de matplotlib en Streamlit"""
+def show_matplotlib_plot(fig):
+    """Muestra una figura de matplotlib en Streamlit y la cierra"""
+    plt = import_pyplot()
+    try:
+        if fig.get_axes():  # Solo mostrar si hay contenido
+            st.pyplot(fig)
+    finally:
+        plt.close(fig)
+
+# Serialización de tablas con caché: sólo se repite cuando cambia el contenido de la tabla
+# (hash completo del contenido; el hash por defecto de Streamlit muestrea las tablas grandes)
+def hash_dataframe(df):
+    return tuple(df.columns), pd.util.hash_pandas_object(df, index=True).values.tobytes()
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, hash_funcs={pd.DataFrame: hash_dataframe})
+def df_to_csv(df):
+    """Convierte una tabla a CSV (bytes UTF-8)"""
+    return df.to_csv(index=False).encode("utf-8")
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, hash_funcs={pd.DataFrame: hash_dataframe})
+def df_to_parquet(df):
+    """Convierte una tabla a Parquet comprimido con snappy"""
+    parquet_buffer = BytesIO()
+    df.to_parquet(parquet_buffer, engine="pyarrow", compression="snappy", index=False)
+    return parquet_buffer.getvalue()
+
+# Función para mostrar botones de descarga de tablas
+def show_download_buttons(df, label, file_name):
+    """Muestra botones de descarga en Parquet (tipado y comprimido) y CSV para una tabla"""
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label=f"{label} (Parquet)",
+            data=df_to_parquet(df),
+            file_name=f"{file_name}.parquet",
+            mime="application/octet-stream"
+        )
+    with col2:
+        st.download_button(
+            label=f"{label} (CSV)",
+            data=df_to_csv(df),
+            file_name=f"{file_name}.csv",
+            mime="text/csv"
+        )
+
+# Máximo de filas que se envían al navegador en las vistas previas de resultados
+PREVIEW_ROWS = 500
+
+# Función para mostrar una vista previa de tablas largas
+def show_dataframe_preview(df):
+    """Muestra sólo las primeras filas de la tabla; la tabla completa queda disponible en la descarga"""
+    st.dataframe(df.head(PREVIEW_ROWS), use_container_width=True)
+    if len(df) > PREVIEW_ROWS:
+        st.caption(f"Mostrando {PREVIEW_ROWS}/{len(df)} filas")
+
+# Directorio temporal en memoria (tmpfs) si existe, para que los CSV no pasen por disco
+SHM_DIR = "/dev/shm"
+
+# Función para elegir el directorio temporal según el espacio libre
+def temp_dir_for(files):
+    """Devuelve /dev/shm si caben los archivos (p. ej. Docker lo limita a 64 MB), si no None (directorio por defecto)"""
+    if not (os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK)):
+        return None
+    stats = os.statvfs(SHM_DIR)
+    return SHM_DIR if stats.f_bavail * stats.f_frsize > sum(file.size for file in files) else None
+
+# Clave de caché: huella blake2b del nombre, tamaño y contenido de los archivos, en orden
+# (se calcula sobre los buffers sin copiarlos; Streamlit sólo hashea esta cadena corta)
+def files_digest(files):
+    """Calcula la huella de los archivos subidos usada como clave de caché"""
+    h = hashlib.blake2b(digest_size=16)
+    for file in files:
+        h.update(f"{file.name}\0{file.size}\0".encode())
+        h.update(file.getbuffer())
+    return h.hexdigest()
+
+# Función para escribir un archivo subido en el directorio temporal
+def write_uploaded_file(args):
+    """Escribe el buffer en la ruta dada y devuelve la ruta"""
+    file_path, buffer = args
+    with open(file_path, "wb") as f:
+        f.write(buffer)
+    return file_path
+
+# Lectura de archivos con caché (se reutiliza mientras el contenido no cambie)
+@st.cache_data(show_spinner=False, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def read_data_files(data_key, _files):
+    """Procesa los archivos subidos con pICNIK y devuelve xtr, B, T0 y el gráfico de resumen"""
+    pnk, plt = load_picnik(), load_pyplot()
+    with tempfile.TemporaryDirectory(prefix="picnik_", dir=temp_dir_for(_files)) as temp_dir:
+        # Escritura en paralelo (E/S que libera el GIL); el índice en la ruta evita colisiones
+        # entre archivos subidos con el mismo nombre
+        write_args = [(os.path.join(temp_dir, f"{i}_{file.name}"), file.getbuffer()) for i, file in enumerate(_files)]
+        with ThreadPoolExecutor(max_workers=min(len(write_args), 8)) as executor:
+            file_paths = list(executor.map(write_uploaded_file, write_args))
+        
+        xtr = pnk.DataExtraction()
+        B, T0 = xtr.read_files(file_paths)
+    
+    # Arreglos contiguos float64 para los cálculos posteriores de pICNIK
+    B = np.ascontiguousarray(B, dtype=np.float64)
+    T0 = np.ascontiguousarray(T0, dtype=np.float64)
+    
+    fig = plt.gcf()
+    plt.close(fig)
+    return xtr, B, T0, fig
+
+# Cálculos de pICNIK con caché: volver a parámetros ya usados no repite el cálculo
+# (los objetos de pICNIK se pasan con "_" para que Streamlit no los hashee; la clave es el resto de argumentos).
+# Conversion e Isoconversion acumulan resultados en xtr, así que se trabaja sobre una copia:
+# el resultado depende sólo de la clave y no del historial del objeto de la sesión
+@st.cache_data(show_spinner=False, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def compute_conversion(data_key, t_min, t_max, _xtr_raw):
+    """Calcula la conversión en el rango dado sobre una copia del xtr sin convertir y devuelve la copia y su gráfico"""
+    plt = load_pyplot()
+    xtr = copy.deepcopy(_xtr_raw)
+    xtr.Conversion(t_min, t_max)
     fig = plt.gcf()
-    if fig.get_axes():  # Solo mostrar si hay contenido
-        st.pyplot(fig)
     plt.close(fig)
+    return xtr, fig
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def compute_isoconversion(conversion_key, d_a, _xtr):
+    """Genera las tablas isoconversionales para la conversión identificada por conversion_key"""
+    return copy.deepcopy(_xtr).Isoconversion(d_a=d_a)
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def compute_activation_energy(iso_key, method_code, params, _ace):
+    """Calcula la energía de activación con el método indicado"""
+    dispatch = {
+        "Fr": _ace.Fr,
+        "KAS": _ace.KAS,
+        "OFW": _ace.OFW,
+        "Vy": _ace.Vy,
+        "aVy": lambda params=params: _ace.aVy(params)
+    }
+    return dispatch[method_code]()
+
+# Módulos de la app y métodos de energía de activación (constantes de módulo, se crean una vez)
+MODULES = (
+    "1. Carga de Datos y Resumen Gráfico",
+    "2. Rango de Temperatura para Conversión",
+    "3. Cálculo de Valores de Conversión",
+    "4. Tablas Isoconversionales",
+    "5. Cálculo de Energía de Activación",
+    "6. Predicción Model-free"
+)
+
+METHODS = {
+    "Friedman": "Fr",
+    "Kissinger-Akahira-Sunose": "KAS",
+    "Ozawa-Flynn-Wall": "OFW",
+    "Vyazovkin": "Vy",
+    "Vyazovkin Avanzado": "aVy"
+}
+METHOD_NAMES = tuple(METHODS)
 
 # Sidebar para navegación
 st.sidebar.title("📋 Módulos de Análisis")
-module = st.sidebar.selectbox(
-    "Seleccionar módulo:",
-    [
-        "1. Carga de Datos y Resumen Gráfico",
-        "2. Rango de Temperatura para Conversión", 
-        "3. Cálculo de Valores de Conversión",
-        "4. Tablas Isoconversionales",
-        "5. Cálculo de Energía de Activación",
-        "6. Predicción Model-free"
-    ]
-)
+module = st.sidebar.selectbox("Seleccionar módulo:", MODULES)
 
 # Estado del progreso en sidebar
 st.sidebar.markdown("---")
-st.sidebar.markdown("**📊 Estado del Análisis:**")
-st.sidebar.write(f"🔧 Datos cargados: {'✅' if st.session_state.B is not None else '❌'}")
-st.sidebar.write(f"📈 Conversión calculada: {'✅' if st.session_state.conversion_done else '❌'}")
-st.sidebar.write(f"📋 Tablas isoconversionales: {'✅' if st.session_state.Iso_Tables is not None else '❌'}")
-st.sidebar.write(f"⚡ Energías calculadas: {len(st.session_state.calculated_energies)}")
+st.sidebar.markdown("\n\n".join([
+    "**📊 Estado del Análisis:**",
+    f"🔧 Datos cargados: {'✅' if st.session_state.B is not None else '❌'}",
+    f"📈 Conversión calculada: {'✅' if st.session_state.conversion_done else '❌'}",
+    f"📋 Tablas isoconversionales: {'✅' if st.session_state.Iso_Tables is not None else '❌'}",
+    f"⚡ Energías calculadas: {len(st.session_state.calculated_energies)}"
+]))
 
 # ==================== MÓDULO 1 ====================
 if module == "1. Carga de Datos y Resumen Gráfico":
@@ -109,41 +292,45 @@ if module == "1. Carga de Datos y Resumen Gráfico":
         if st.button("🚀 Procesar archivos", type="primary"):
             try:
                 # Validar orden
-                order_indices = [int(idx.strip()) for idx in order_input.split(',')]
-                if len(order_indices) != len(uploaded_files) or set(order_indices) != set(range(len(uploaded_files))):
+                order_indices = np.fromstring(order_input, sep=',', dtype=np.int64)
+                n_files = len(uploaded_files)
+                if order_indices.size != n_files or not np.array_equal(np.sort(order_indices), np.arange(n_files)):
                     st.error("❌ Error: Los índices deben ser una permutación completa de 0 a n-1")
                 else:
-                    # Crear archivos temporales
-                    with tempfile.TemporaryDirectory() as temp_dir:
-                        file_paths = []
-                        ordered_files = [uploaded_files[i] for i in order_indices]
-                        
-                        for file in ordered_files:
-                            file_path = os.path.join(temp_dir, file.name)
-                            with open(file_path, "wb") as f:
-                                f.write(file.getbuffer())
-                            file_paths.append(file_path)
-                        
-                        ################################################################ Funciones de pICNIK
-                        with st.spinner("Procesando archivos..."):
-                            st.session_state.xtr = pnk.DataExtraction()
-                            st.session_state.B, st.session_state.T0 = st.session_state.xtr.read_files(file_paths)
-                        ################################################################
+                    ordered_files = np.asarray(uploaded_files, dtype=object)[order_indices].tolist()
+                    data_key = files_digest(ordered_files)
+                    
+                    ################################################################ Funciones de pICNIK
+                    require_picnik()
+                    with st.spinner("Procesando archivos..."):
+                        st.session_state.xtr_raw, st.session_state.B, st.session_state.T0, summary_fig = read_data_files(data_key, ordered_files)
+                        st.session_state.xtr = st.session_state.xtr_raw  # se sustituye por la copia convertida en el Módulo 3
+                        st.session_state.data_key = data_key
+                        # Datos nuevos: los resultados posteriores ya no corresponden a ellos
+                        st.session_state.conversion_done = False
+                        st.session_state.conversion_key = None
+                        st.session_state.isoconversion_done = False
+                        st.session_state.Iso_Tables = None
+                        st.session_state.iso_key = None
+                        st.session_state.ace = None
+                        st.session_state.ace_key = None
+                        st.session_state.calculated_energies = {}
+                    ################################################################
 
-                        st.success("✅ Archivos procesados exitosamente")
-                        
-                        # Mostrar información
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.write("🌡️ **Velocidades de calentamiento (K/min):**")
-                            st.write(st.session_state.B)
-                        with col2:
-                            st.write("🌡️ **Temperaturas iniciales (K):**")
-                            st.write(st.session_state.T0)
-                        
-                        # Mostrar gráfico de resumen
-                        st.subheader("📊 Resumen gráfico de datos")
-                        show_matplotlib_plot()
+                    st.success("✅ Archivos procesados exitosamente")
+                    
+                    # Mostrar información
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.write("🌡️ **Velocidades de calentamiento (K/min):**")
+                        st.write(st.session_state.B)
+                    with col2:
+                        st.write("🌡️ **Temperaturas iniciales (K):**")
+                        st.write(st.session_state.T0)
+                    
+                    # Mostrar gráfico de resumen
+                    st.subheader("📊 Resumen gráfico de datos")
+                    show_matplotlib_plot(summary_fig)
                         
             except ValueError:
                 st.error("❌ Error: Por favor ingrese números válidos separados por comas")
@@ -173,9 +360,10 @@ elif module == "2. Rango de Temperatura para Conversión":
         
         if st.button("📈 Generar gráfico"):
             try:
+                plt = load_pyplot()
                 ################################################################ funciones de picnik
                 st.session_state.xtr.plot_data(x_data=x_data, y_data=y_data, x_units=x_units, y_units=y_units)
-                show_matplotlib_plot()
+                show_matplotlib_plot(plt.gcf())  # plot_data crea su propia figura
                 st.success("✅ Gráfico generado exitosamente")
             except Exception as e:
                 st.error(f"❌ Error al generar gráfico: {str(e)}")
@@ -184,17 +372,9 @@ elif module == "2. Rango de Temperatura para Conversión":
         st.subheader("🎯 Configurar rango de temperatura")
         col1, col2 = st.columns(2)
         with col1:
-            st.session_state.t_min = st.number_input(
-                "Temperatura mínima (K):", 
-                value=float(st.session_state.t_min), 
-                min_value=0.0
-            )
+            st.number_input("Temperatura mínima (K):", key="t_min", min_value=0.0)
         with col2:
-            st.session_state.t_max = st.number_input(
-                "Temperatura máxima (K):", 
-                value=float(st.session_state.t_max), 
-                min_value=0.0
-            )
+            st.number_input("Temperatura máxima (K):", key="t_max", min_value=0.0)
         
         st.info(f"🎯 Rango seleccionado: {st.session_state.t_min:.1f} - {st.session_state.t_max:.1f} K")
 
@@ -211,24 +391,25 @@ elif module == "3. Cálculo de Valores de Conversión":
         # Modificar rango si es necesario
         col1, col2 = st.columns(2)
         with col1:
-            temp_min = st.number_input("Temperatura mínima (K):", value=st.session_state.t_min)
+            temp_min = st.number_input("Temperatura mínima (K):", key="t_min", min_value=0.0)
         with col2:
-            temp_max = st.number_input("Temperatura máxima (K):", value=st.session_state.t_max)
+            temp_max = st.number_input("Temperatura máxima (K):", key="t_max", min_value=0.0)
         
         if st.button("🔄 Calcular conversión", type="primary"):
             try:
                 with st.spinner("Calculando conversión..."):
                     ################################################################ funciones de picnik
-                    st.session_state.xtr.Conversion(temp_min, temp_max)
+                    st.session_state.xtr, conversion_fig = compute_conversion(
+                        st.session_state.data_key, temp_min, temp_max, st.session_state.xtr_raw
+                    )
                     st.session_state.conversion_done = True
-                    st.session_state.t_min = temp_min
-                    st.session_state.t_max = temp_max
+                    st.session_state.conversion_key = (st.session_state.data_key, temp_min, temp_max)
                 
                 st.success("✅ Conversión calculada exitosamente")
                 
                 # Mostrar gráfico
                 st.subheader("📊 Gráfico de conversión vs temperatura")
-                show_matplotlib_plot()
+                show_matplotlib_plot(conversion_fig)
                 
             except Exception as e:
                 st.error(f"❌ Error al calcular conversión: {str(e)}")
@@ -242,7 +423,7 @@ elif module == "4. Tablas Isoconversionales":
     
     if st.session_state.xtr is None:
         st.warning("⚠️ Primero debe cargar los datos en el Módulo 1")
-    elif not st.session_state.conversion_done:
+    elif not st.session_state.conversion_done or st.session_state.conversion_key[0] != st.session_state.data_key:
         st.warning("⚠️ Primero debe calcular la conversión en el Módulo 3")
     else:
         st.subheader("⚙️ Configuración de tablas isoconversionales")
@@ -259,8 +440,15 @@ elif module == "4. Tablas Isoconversionales":
         if st.button("📊 Generar tablas isoconversionales", type="primary"):
             try:
                 with st.spinner("Generando tablas isoconversionales..."):
-                    st.session_state.Iso_Tables = st.session_state.xtr.Isoconversion(d_a=d_a)
+                    st.session_state.Iso_Tables = compute_isoconversion(
+                        st.session_state.conversion_key, d_a, st.session_state.xtr
+                    )
                     st.session_state.isoconversion_done = True
+                    iso_key = (st.session_state.conversion_key, d_a)
+                    if iso_key != st.session_state.iso_key:
+                        # Tablas nuevas: las energías anteriores ya no les corresponden
+                        st.session_state.calculated_energies = {}
+                    st.session_state.iso_key = iso_key
                 
                 st.success("✅ Tablas isoconversionales generadas exitosamente")
                 
@@ -276,14 +464,8 @@ elif module == "4. Tablas Isoconversionales":
                 df_temp = pd.DataFrame(st.session_state.Iso_Tables[0])
                 st.dataframe(df_temp, use_container_width=True)
                 
-                # Botón de descarga
-                csv_data = df_temp.to_csv(index=False)
-                st.download_button(
-                    label="📥 Descargar tabla de temperaturas",
-                    data=csv_data,
-                    file_name="temperaturas_isoconversionales.csv",
-                    mime="text/csv"
-                )
+                # Botones de descarga
+                show_download_buttons(df_temp, "📥 Descargar tabla de temperaturas", "temperaturas_isoconversionales")
             
             # Mostrar la segunda tabla si existe (tiempos)
             if len(st.session_state.Iso_Tables) > 1:
@@ -291,13 +473,7 @@ elif module == "4. Tablas Isoconversionales":
                 df_time = pd.DataFrame(st.session_state.Iso_Tables[1])
                 st.dataframe(df_time, use_container_width=True)
                 
-                csv_data_time = df_time.to_csv(index=False)
-                st.download_button(
-                    label="📥 Descargar tabla de tiempos",
-                    data=csv_data_time,
-                    file_name="tiempos_isoconversionales.csv",
-                    mime="text/csv"
-                )
+                show_download_buttons(df_time, "📥 Descargar tabla de tiempos", "tiempos_isoconversionales")
 
 # ==================== MÓDULO 5 ====================
 elif module == "5. Cálculo de Energía de Activación":
@@ -307,48 +483,41 @@ elif module == "5. Cálculo de Energía de Activación":
         st.warning("⚠️ Primero debe generar las tablas isoconversionales en el Módulo 4")
     else:
         ################################################################ ActivationEergy class
-        # Crear objeto ActivationEnergy si no existe
-        if st.session_state.ace is None:
-            st.session_state.ace = pnk.ActivationEnergy(
+        # Crear objeto ActivationEnergy si no existe o si las tablas isoconversionales cambiaron
+        if st.session_state.ace is None or st.session_state.ace_key != st.session_state.iso_key:
+            st.session_state.ace = load_picnik().ActivationEnergy(
                 st.session_state.B, 
                 st.session_state.T0, 
                 st.session_state.Iso_Tables
             )
+            st.session_state.ace_key = st.session_state.iso_key
+            # Las energías anteriores corresponden a otras tablas
+            st.session_state.calculated_energies = {}
         
         st.subheader("🔬 Seleccionar método de cálculo")
         
-        methods = {
-            "Friedman": "Fr",
-            "Kissinger-Akahira-Sunose": "KAS", 
-            "Ozawa-Flynn-Wall": "OFW",
-            "Vyazovkin": "Vy",
-            "Vyazovkin Avanzado": "aVy"
-        }
-        
-        selected_method = st.selectbox("Método de cálculo:", list(methods.keys()))
-        method_code = methods[selected_method]
+        selected_method = st.selectbox("Método de cálculo:", METHOD_NAMES)
+        method_code = METHODS[selected_method]
         
         # Parámetros adicionales para aVy
+        params = None
         if selected_method == "Vyazovkin Avanzado":
             col1, col2 = st.columns(2)
             with col1:
                 param1 = st.number_input("Parámetro 1:", value=5, min_value=1)
             with col2:
                 param2 = st.number_input("Parámetro 2:", value=180, min_value=1)
+            params = (param1, param2)
         ################################################################ Aquí se definen los casos para los métodos en el cálculo de la energía
         if st.button("⚡ Calcular energía de activación", type="primary"):
             try:
                 with st.spinner(f"Calculando energía con método {selected_method}..."):
-                    if selected_method == "Vyazovkin Avanzado":
-                        result = st.session_state.ace.aVy((param1, param2))
-                    elif selected_method == "Friedman":
-                        result = st.session_state.ace.Fr()
-                    elif selected_method == "Kissinger-Akahira-Sunose":
-                        result = st.session_state.ace.KAS()
-                    elif selected_method == "Ozawa-Flynn-Wall":
-                        result = st.session_state.ace.OFW()
-                    elif selected_method == "Vyazovkin":
-                        result = st.session_state.ace.Vy()
+                    ace = st.session_state.ace
+                    result = compute_activation_energy(st.session_state.iso_key, method_code, params, ace)
+                    # Registrar el resultado en ace también cuando viene de la caché (para Ea_plot y export)
+                    setattr(ace, f"E_{method_code}", result)
+                    if method_code not in ace.used_methods:
+                        ace.used_methods.append(method_code)
                 
                 st.session_state.calculated_energies[method_code] = result
                 st.success(f"✅ Energía de activación calculada con método {selected_method}")
@@ -365,33 +534,34 @@ elif module == "5. Cálculo de Energía de Activación":
             
             # Mostrar gráfico
             if st.button("📈 Mostrar gráfico de energías"):
+                # Figura propia: Ea_plot dibuja sobre los ejes actuales de pyplot
+                plt = load_pyplot()
+                ea_fig, _ = plt.subplots()
                 try:
                     ################################################################ funcion de picnik
                     st.session_state.ace.Ea_plot(ylim=(50, 95))
-                    show_matplotlib_plot()
+                    show_matplotlib_plot(ea_fig)
                 except Exception as e:
+                    plt.close(ea_fig)
                     st.error(f"❌ Error al mostrar gráfico: {str(e)}")
             
             # Exportar resultados
             if st.button("📥 Exportar resultados"):
                 try:
-                    # Capturar salida de export_Ea
-                    buffer = StringIO()
-                    old_stdout = sys.stdout
-                    sys.stdout = buffer
+                    # Mismas columnas que ace.export_Ea(), construidas desde los resultados en memoria
+                    # (export_Ea escribe un archivo por método en el directorio de trabajo)
+                    energy_df = pd.concat([
+                        pd.DataFrame({
+                            'method': method,
+                            'conversion': energy[0],
+                            'Temperature [K]': energy[1],
+                            'E [kJ/mol]': energy[2],
+                            'error [kJ/mol]': energy[3]
+                        })
+                        for method, energy in st.session_state.calculated_energies.items()
+                    ], ignore_index=True)
                     
-                    ################################################################ función de picnik
-                    st.session_state.ace.export_Ea()
-                    
-                    sys.stdout = old_stdout
-                    output = buffer.getvalue()
-                    
-                    st.download_button(
-                        label="📥 Descargar resultados de energía",
-                        data=output,
-                        file_name="energia_activacion.csv",
-                        mime="text/csv"
-                    )
+                    show_download_buttons(energy_df, "📥 Descargar resultados de energía", "energia_activacion")
                     st.success("✅ Resultados exportados")
                 except Exception as e:
                     st.error(f"❌ Error al exportar: {str(e)}")
@@ -446,16 +616,10 @@ elif module == "6. Predicción Model-free":
                     })
                     
                     st.subheader("📊 Resultados de la predicción")
-                    st.dataframe(results_df, use_container_width=True)
+                    show_dataframe_preview(results_df)
                     
                     # Descargar predicción
-                    csv_data = results_df.to_csv(index=False)
-                    st.download_button(
-                        label="📥 Descargar predicción isotérmica",
-                        data=csv_data,
-                        file_name="prediccion_isotermica.csv",
-                        mime="text/csv"
-                    )
+                    show_download_buttons(results_df, "📥 Descargar predicción isotérmica", "prediccion_isotermica")
                     
                 except Exception as e:
                     st.error(f"❌ Error en predicción isotérmica: {str(e)}")
@@ -489,16 +653,10 @@ elif module == "6. Predicción Model-free":
                     })
                     
                     st.subheader("📊 Resultados de la predicción")
-                    st.dataframe(results_df, use_container_width=True)
+                    show_dataframe_preview(results_df)
                     
                     # Descargar predicción
-                    csv_data = results_df.to_csv(index=False)
-                    st.download_button(
-                        label="📥 Descargar predicción lineal",
-                        data=csv_data,
-                        file_name="prediccion_lineal.csv",
-                        mime="text/csv"
-                    )
+                    show_download_buttons(results_df, "📥 Descargar predicción lineal", "prediccion_lineal")
                     
                 except Exception as e:
                     st.error(f"❌ Error en predicción lineal: {str(e)}")
@@ -518,14 +676,11 @@ elif module == "6. Predicción Model-free":
             if st.button("🔮 Calcular predicción mixta", type="primary"):
                 try:
                     with st.spinner("Calculando predicción mixta..."):
-                        def temp_program_func(t):
-                            """Función de programa de temperatura mixto"""
-                            heating_time = (temp_isothermal - temp_initial) / heating_rate
-                            return np.array([
-                                (temp_initial + heating_rate * time) if time <= heating_time 
-                                else temp_isothermal 
-                                for time in t
-                            ])
+                        # Constantes del programa ligadas como argumentos por defecto: se resuelven una vez
+                        # y el integrador sólo hace búsquedas locales en cada llamada
+                        def temp_program_func(t, T0=float(temp_initial), Hr=float(heating_rate), Tiso=float(temp_isothermal)):
+                            """Función de programa de temperatura mixto (rampa lineal hasta la isoterma)"""
+                            return np.minimum(T0 + Hr * np.asarray(t, dtype=np.float64), Tiso)
                         
                         energy_data = st.session_state.calculated_energies[selected_energy]
                         ################################################################ función de picnik
@@ -544,16 +699,10 @@ elif module == "6. Predicción Model-free":
                     })
                     
                     st.subheader("📊 Resultados de la predicción")
-                    st.dataframe(results_df, use_container_width=True)
+                    show_dataframe_preview(results_df)
                     
                     # Descargar predicción
-                    csv_data = results_df.to_csv(index=False)
-                    st.download_button(
-                        label="📥 Descargar predicción mixta",
-                        data=csv_data,
-                        file_name="prediccion_mixta.csv",
-                        mime="text/csv"
-                    )
+                    show_download_buttons(results_df, "📥 Descargar predicción mixta", "prediccion_mixta")
                     
                 except Exception as e:
                     st.error(f"❌ Error en predicción mixta: {str(e)}")